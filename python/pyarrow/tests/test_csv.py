@@ -16,16 +16,13 @@
 # under the License.
 
 import bz2
+from concurrent import futures
 from datetime import datetime
 from decimal import Decimal
 import gzip
 import io
 import itertools
-import os
-import shutil
 import string
-import tempfile
-import unittest
 
 import pytest
 
@@ -36,30 +33,60 @@ from pyarrow.csv import read_csv, ReadOptions, ParseOptions, ConvertOptions
 
 
 def generate_col_names():
-    # 'a', 'b'... 'z', then 'aa', 'ab'...
+    # 'a', 'b'... 'z', then 'aa', 'ab'... 'zz', then 'aaa', 'aab'...
     letters = string.ascii_lowercase
     for letter in letters:
         yield letter
-    for first in letter:
-        for second in letter:
-            yield first + second
+    for first, second in itertools.product(letters, repeat=2):
+        yield first + second
+    for first, second, third in itertools.product(letters, repeat=3):
+        yield first + second + third
 
 
 def make_random_csv(num_cols=2, num_rows=10, linesep=u'\r\n'):
-    arr = np.random.RandomState(42).randint(0, 1000, size=(num_cols, num_rows))
+    # Generate int64 directly, to match the expected Arrow column type
+    rng = np.random.RandomState(42)
+    arr = rng.randint(0, 1000, size=(num_cols, num_rows), dtype=np.int64)
     col_names = list(itertools.islice(generate_col_names(), num_cols))
-    csv = io.StringIO()
-    csv.write(u",".join(col_names))
-    csv.write(linesep)
-    for row in arr.T:
-        csv.write(u",".join(map(str, row)))
-        csv.write(linesep)
-    csv = csv.getvalue().encode()
+    # Format all rows at once, directly as bytes, rather than joining
+    # and encoding each row separately
+    linesep = linesep.encode()
+    row_format = b",".join([b"%d"] * num_cols) + linesep
+    csv = u",".join(col_names).encode() + linesep
+    csv += (row_format * num_rows) % tuple(arr.T.ravel().tolist())
+    # Each row of the C-contiguous int64 matrix is wrapped without copying
     columns = [pa.array(a, type=pa.int64()) for a in arr]
     expected = pa.Table.from_arrays(columns, col_names)
     return csv, expected
 
 
+# The random data is deterministic, so generate it once per module
+# (tables are immutable and can be shared between tests)
+
+@pytest.fixture(scope='module')
+def small_random_csv():
+    return make_random_csv(num_cols=2, num_rows=10)
+
+
+@pytest.fixture(scope='module')
+def medium_random_csv():
+    return make_random_csv(num_cols=2, num_rows=100)
+
+
+@pytest.fixture(scope='module')
+def large_random_csv():
+    return make_random_csv(num_cols=2, num_rows=500)
+
+
+def check_table_equals(table, expected, msg=""):
+    assert table.schema == expected.schema, msg
+    if not table.equals(expected):
+        # Only convert to Python objects on failure, for better error output
+        assert table.to_pydict() == expected.to_pydict(), msg
+        raise AssertionError("{0}\nTables are not equal:\n{1}\n{2}"
+                             .format(msg, table, expected))
+
+
 def test_read_options():
     cls = ReadOptions
     opts = cls()
@@ -187,10 +214,61 @@ def test_convert_options():
     assert opts.strings_can_be_null is True
 
 
-class BaseTestCSVRead:
+# Expected schemas of the tables read in TestCSVRead
+_SCHEMA_SIMPLE_INTS = pa.schema([('a', pa.int64()),
+                                 ('b', pa.int64()),
+                                 ('c', pa.int64())])
+_SCHEMA_SIMPLE_VARIED = pa.schema([('a', pa.float64()),
+                                   ('b', pa.int64()),
+                                   ('c', pa.string()),
+                                   ('d', pa.bool_())])
+_SCHEMA_SIMPLE_NULLS = pa.schema([('a', pa.float64()),
+                                  ('b', pa.int64()),
+                                  ('c', pa.string()),
+                                  ('d', pa.null()),
+                                  ('e', pa.binary()),
+                                  ('f', pa.bool_())])
+_SCHEMA_SIMPLE_TIMESTAMPS = pa.schema([('a', pa.int64()),
+                                       ('b', pa.timestamp('s'))])
+_SCHEMA_COLUMN_TYPES = pa.schema([('a', pa.int64()),
+                                  ('b', pa.float32()),
+                                  ('c', pa.string()),
+                                  ('d', pa.bool_()),
+                                  ('e', pa.decimal128(11, 2))])
+
+
+class TestCSVRead:
+
+    @pytest.fixture(autouse=True, params=[False, True],
+                    ids=['serial', 'parallel'])
+    def set_use_threads(self, request):
+        self.use_threads = request.param
+
+    # read_csv() copies its options, so the defaults can be shared
+    # between calls
+    default_read_options = {
+        False: ReadOptions(use_threads=False),
+        True: ReadOptions(use_threads=True),
+        }
+
+    def read_csv(self, *args, **kwargs):
+        # Only validate the tables where buffer layout bugs are likely
+        # to show up (e.g. string, binary, decimal or null columns,
+        # larger random data)
+        validate = kwargs.pop('validate', False)
+        read_options = kwargs.get('read_options')
+        if read_options is None:
+            kwargs['read_options'] = \
+                self.default_read_options[self.use_threads]
+        else:
+            read_options.use_threads = self.use_threads
+        table = read_csv(*args, **kwargs)
+        if validate:
+            table._validate()
+        return table
 
     def read_bytes(self, b, **kwargs):
-        return self.read_csv(pa.py_buffer(b), **kwargs)
+        return self.read_csv(pa.BufferReader(b), **kwargs)
 
     def check_names(self, table, names):
         assert table.num_columns == len(names)
@@ -209,7 +287,7 @@ class BaseTestCSVRead:
 
     def test_header(self):
         rows = b"abc,def,gh\n"
-        table = self.read_bytes(rows)
+        table = self.read_bytes(rows, validate=True)
         assert isinstance(table, pa.Table)
         self.check_names(table, ["abc", "def", "gh"])
         assert table.num_rows == 0
@@ -225,7 +303,7 @@ class BaseTestCSVRead:
 
         opts = ReadOptions()
         opts.skip_rows = 1
-        table = self.read_bytes(rows, read_options=opts)
+        table = self.read_bytes(rows, read_options=opts, validate=True)
         self.check_names(table, ["ef", "gh"])
         assert table.to_pydict() == {
             "ef": ["ij", "mn"],
@@ -233,7 +311,7 @@ class BaseTestCSVRead:
             }
 
         opts.skip_rows = 3
-        table = self.read_bytes(rows, read_options=opts)
+        table = self.read_bytes(rows, read_options=opts, validate=True)
         self.check_names(table, ["mn", "op"])
         assert table.to_pydict() == {
             "mn": [],
@@ -248,7 +326,7 @@ class BaseTestCSVRead:
         # Can skip rows with a different number of columns
         rows = b"abcd\n,,,,,\nij,kl\nmn,op\n"
         opts.skip_rows = 2
-        table = self.read_bytes(rows, read_options=opts)
+        table = self.read_bytes(rows, read_options=opts, validate=True)
         self.check_names(table, ["ij", "kl"])
         assert table.to_pydict() == {
             "ij": ["mn"],
@@ -260,7 +338,7 @@ class BaseTestCSVRead:
 
         opts = ReadOptions()
         opts.column_names = ["x", "y"]
-        table = self.read_bytes(rows, read_options=opts)
+        table = self.read_bytes(rows, read_options=opts, validate=True)
         self.check_names(table, ["x", "y"])
         assert table.to_pydict() == {
             "x": ["ab", "ef", "ij", "mn"],
@@ -268,7 +346,7 @@ class BaseTestCSVRead:
             }
 
         opts.skip_rows = 3
-        table = self.read_bytes(rows, read_options=opts)
+        table = self.read_bytes(rows, read_options=opts, validate=True)
         self.check_names(table, ["x", "y"])
         assert table.to_pydict() == {
             "x": ["mn"],
@@ -276,7 +354,7 @@ class BaseTestCSVRead:
             }
 
         opts.skip_rows = 4
-        table = self.read_bytes(rows, read_options=opts)
+        table = self.read_bytes(rows, read_options=opts, validate=True)
         self.check_names(table, ["x", "y"])
         assert table.to_pydict() == {
             "x": [],
@@ -299,7 +377,7 @@ class BaseTestCSVRead:
         rows = b"abcd\n,,,,,\nij,kl\nmn,op\n"
         opts.skip_rows = 2
         opts.column_names = ["x", "y"]
-        table = self.read_bytes(rows, read_options=opts)
+        table = self.read_bytes(rows, read_options=opts, validate=True)
         self.check_names(table, ["x", "y"])
         assert table.to_pydict() == {
             "x": ["ij", "mn"],
@@ -310,10 +388,7 @@ class BaseTestCSVRead:
         # Infer integer columns
         rows = b"a,b,c\n1,2,3\n4,5,6\n"
         table = self.read_bytes(rows)
-        schema = pa.schema([('a', pa.int64()),
-                            ('b', pa.int64()),
-                            ('c', pa.int64())])
-        assert table.schema == schema
+        assert table.schema == _SCHEMA_SIMPLE_INTS
         assert table.to_pydict() == {
             'a': [1, 4],
             'b': [2, 5],
@@ -323,12 +398,8 @@ class BaseTestCSVRead:
     def test_simple_varied(self):
         # Infer various kinds of data
         rows = b"a,b,c,d\n1,2,3,0\n4.0,-5,foo,True\n"
-        table = self.read_bytes(rows)
-        schema = pa.schema([('a', pa.float64()),
-                            ('b', pa.int64()),
-                            ('c', pa.string()),
-                            ('d', pa.bool_())])
-        assert table.schema == schema
+        table = self.read_bytes(rows, validate=True)
+        assert table.schema == _SCHEMA_SIMPLE_VARIED
         assert table.to_pydict() == {
             'a': [1.0, 4.0],
             'b': [2, -5],
@@ -342,14 +413,8 @@ class BaseTestCSVRead:
                 b"1,2,,,3,N/A\n"
                 b"nan,-5,foo,,nan,TRUE\n"
                 b"4.5,#N/A,nan,,\xff,false\n")
-        table = self.read_bytes(rows)
-        schema = pa.schema([('a', pa.float64()),
-                            ('b', pa.int64()),
-                            ('c', pa.string()),
-                            ('d', pa.null()),
-                            ('e', pa.binary()),
-                            ('f', pa.bool_())])
-        assert table.schema == schema
+        table = self.read_bytes(rows, validate=True)
+        assert table.schema == _SCHEMA_SIMPLE_NULLS
         assert table.to_pydict() == {
             'a': [1.0, None, 4.5],
             'b': [2, -5, None],
@@ -363,9 +428,7 @@ class BaseTestCSVRead:
         # Infer a timestamp column
         rows = b"a,b\n1970,1970-01-01\n1989,1989-07-14\n"
         table = self.read_bytes(rows)
-        schema = pa.schema([('a', pa.int64()),
-                            ('b', pa.timestamp('s'))])
-        assert table.schema == schema
+        assert table.schema == _SCHEMA_SIMPLE_TIMESTAMPS
         assert table.to_pydict() == {
             'a': [1970, 1989],
             'b': [datetime(1970, 1, 1), datetime(1989, 7, 14)],
@@ -375,7 +438,7 @@ class BaseTestCSVRead:
         # Infer nulls with custom values
         opts = ConvertOptions(null_values=['Xxx', 'Zzz'])
         rows = b"a,b,c,d\nZzz,Xxx,1,2\nXxx,#N/A,,Zzz\n"
-        table = self.read_bytes(rows, convert_options=opts)
+        table = self.read_bytes(rows, convert_options=opts, validate=True)
         schema = pa.schema([('a', pa.null()),
                             ('b', pa.string()),
                             ('c', pa.string()),
@@ -390,7 +453,7 @@ class BaseTestCSVRead:
 
         opts = ConvertOptions(null_values=['Xxx', 'Zzz'],
                               strings_can_be_null=True)
-        table = self.read_bytes(rows, convert_options=opts)
+        table = self.read_bytes(rows, convert_options=opts, validate=True)
         assert table.to_pydict() == {
             'a': [None, None],
             'b': [None, u"#N/A"],
@@ -400,7 +463,7 @@ class BaseTestCSVRead:
 
         opts = ConvertOptions(null_values=[])
         rows = b"a,b\n#N/A,\n"
-        table = self.read_bytes(rows, convert_options=opts)
+        table = self.read_bytes(rows, convert_options=opts, validate=True)
         schema = pa.schema([('a', pa.string()),
                             ('b', pa.string())])
         assert table.schema == schema
@@ -419,7 +482,7 @@ class BaseTestCSVRead:
                 b"True,yes,yes\n"
                 b"False,no,no\n"
                 b"N/A,N/A,N/A\n")
-        table = self.read_bytes(rows, convert_options=opts)
+        table = self.read_bytes(rows, convert_options=opts, validate=True)
         schema = pa.schema([('a', pa.string()),
                             ('b', pa.bool_()),
                             ('c', pa.string())])
@@ -438,12 +501,7 @@ class BaseTestCSVRead:
                                             'e': pa.decimal128(11, 2),
                                             'zz': 'null'})
         rows = b"a,b,c,d,e\n1,2,3,true,1.0\n4,-5,6,false,0\n"
-        table = self.read_bytes(rows, convert_options=opts)
-        schema = pa.schema([('a', pa.int64()),
-                            ('b', pa.float32()),
-                            ('c', pa.string()),
-                            ('d', pa.bool_()),
-                            ('e', pa.decimal128(11, 2))])
+        table = self.read_bytes(rows, convert_options=opts, validate=True)
         expected = {
             'a': [1, 4],
             'b': [2.0, -5.0],
@@ -451,7 +509,7 @@ class BaseTestCSVRead:
             'd': [True, False],
             'e': [Decimal("1.00"), Decimal("0.00")]
             }
-        assert table.schema == schema
+        assert table.schema == _SCHEMA_COLUMN_TYPES
         assert table.to_pydict() == expected
         # Pass column_types as schema
         opts = ConvertOptions(
@@ -460,8 +518,8 @@ class BaseTestCSVRead:
                                     ('d', pa.bool_()),
                                     ('e', pa.decimal128(11, 2)),
                                     ('zz', pa.bool_())]))
-        table = self.read_bytes(rows, convert_options=opts)
-        assert table.schema == schema
+        table = self.read_bytes(rows, convert_options=opts, validate=True)
+        assert table.schema == _SCHEMA_COLUMN_TYPES
         assert table.to_pydict() == expected
         # One of the columns in column_types fails converting
         rows = b"a,b,c,d,e\n1,XXX,3,true,5\n4,-5,6,false,7\n"
@@ -484,7 +542,7 @@ class BaseTestCSVRead:
     def test_trivial(self):
         # A bit pointless, but at least it shouldn't crash
         rows = b",\n\n"
-        table = self.read_bytes(rows)
+        table = self.read_bytes(rows, validate=True)
         assert table.to_pydict() == {'': []}
 
     def test_invalid_csv(self):
@@ -501,97 +559,92 @@ class BaseTestCSVRead:
 
     def test_options_delimiter(self):
         rows = b"a;b,c\nde,fg;eh\n"
-        table = self.read_bytes(rows)
+        table = self.read_bytes(rows, validate=True)
         assert table.to_pydict() == {
             'a;b': [u'de'],
             'c': [u'fg;eh'],
             }
         opts = ParseOptions(delimiter=';')
-        table = self.read_bytes(rows, parse_options=opts)
+        table = self.read_bytes(rows, parse_options=opts, validate=True)
         assert table.to_pydict() == {
             'a': [u'de,fg'],
             'b,c': [u'eh'],
             }
 
-    def test_small_random_csv(self):
-        csv, expected = make_random_csv(num_cols=2, num_rows=10)
-        table = self.read_bytes(csv)
-        assert table.schema == expected.schema
-        assert table.equals(expected)
-        assert table.to_pydict() == expected.to_pydict()
+    def test_small_random_csv(self, small_random_csv):
+        csv, expected = small_random_csv
+        table = self.read_bytes(csv, validate=True)
+        check_table_equals(table, expected)
 
-    def test_stress_block_sizes(self):
+    def test_stress_block_sizes(self, large_random_csv):
         # Test a number of small block sizes to stress block stitching
-        csv_base, expected = make_random_csv(num_cols=2, num_rows=500)
+        csv_base, expected = large_random_csv
         block_sizes = [11, 12, 13, 17, 37, 111]
         csvs = [csv_base, csv_base.rstrip(b'\r\n')]
-        for csv in csvs:
-            for block_size in block_sizes:
-                read_options = ReadOptions(block_size=block_size)
-                table = self.read_bytes(csv, read_options=read_options)
-                assert table.schema == expected.schema
-                if not table.equals(expected):
-                    # Better error output
-                    assert table.to_pydict() == expected.to_pydict()
-
-
-class TestSerialCSVRead(BaseTestCSVRead, unittest.TestCase):
-
-    def read_csv(self, *args, **kwargs):
-        read_options = kwargs.setdefault('read_options', ReadOptions())
-        read_options.use_threads = False
-        table = read_csv(*args, **kwargs)
-        table._validate()
-        return table
-
-
-class TestParallelCSVRead(BaseTestCSVRead, unittest.TestCase):
-
-    def read_csv(self, *args, **kwargs):
-        read_options = kwargs.setdefault('read_options', ReadOptions())
-        read_options.use_threads = True
-        table = read_csv(*args, **kwargs)
-        table._validate()
-        return table
+        # The reads are independent and release the GIL, so run them
+        # concurrently
+        params = list(itertools.product(csvs, block_sizes))
+        max_workers = min(len(params), pa.cpu_count())
+        with futures.ThreadPoolExecutor(max_workers) as executor:
+            futures_list = [
+                executor.submit(self.read_bytes, csv,
+                                read_options=ReadOptions(block_size=bs),
+                                validate=True)
+                for csv, bs in params]
+            # Check in submission order, to report which read failed
+            for (csv, block_size), future in zip(params, futures_list):
+                table = future.result()
+                msg = ("block_size={0}, trailing newline: {1}"
+                       .format(block_size, csv.endswith(b'\n')))
+                check_table_equals(table, expected, msg)
 
 
 class BaseTestCompressedCSVRead:
 
-    def setUp(self):
-        self.tmpdir = tempfile.mkdtemp(prefix='arrow-csv-test-')
-
-    def tearDown(self):
-        shutil.rmtree(self.tmpdir)
-
-    def test_random_csv(self):
-        csv, expected = make_random_csv(num_cols=2, num_rows=100)
-        csv_path = os.path.join(self.tmpdir, self.csv_filename)
-        self.write_file(csv_path, csv)
+    @classmethod
+    def setup_class(cls):
+        # Skip the whole class upfront if the codec wasn't compiled in
         try:
-            table = read_csv(csv_path)
+            pa.CompressedInputStream(pa.BufferReader(b''), cls.compression)
         except pa.ArrowNotImplementedError as e:
             pytest.skip(str(e))
-            return
+
+    def test_random_csv(self, medium_random_csv):
+        csv, expected = medium_random_csv
+        raw = pa.BufferReader(self.compress(csv))
+        stream = pa.CompressedInputStream(raw, self.compression)
+        table = read_csv(stream)
         table._validate()
-        assert table.schema == expected.schema
-        assert table.equals(expected)
-        assert table.to_pydict() == expected.to_pydict()
+        check_table_equals(table, expected)
+
+    def test_random_csv_file(self, tempdir, medium_random_csv):
+        # Compression is detected from the file extension
+        csv, expected = medium_random_csv
+        csv_path = tempdir / self.csv_filename
+        with open(str(csv_path), 'wb') as f:
+            f.write(self.compress(csv))
+        table = read_csv(str(csv_path))
+        table._validate()
+        check_table_equals(table, expected)
 
 
-class TestGZipCSVRead(BaseTestCompressedCSVRead, unittest.TestCase):
+class TestGZipCSVRead(BaseTestCompressedCSVRead):
+    compression = "gzip"
     csv_filename = "compressed.csv.gz"
 
-    def write_file(self, path, contents):
-        with gzip.open(path, 'wb', 3) as f:
+    def compress(self, contents):
+        buf = io.BytesIO()
+        with gzip.GzipFile(fileobj=buf, mode='wb', compresslevel=3) as f:
             f.write(contents)
+        return buf.getvalue()
 
 
-class TestBZ2CSVRead(BaseTestCompressedCSVRead, unittest.TestCase):
+class TestBZ2CSVRead(BaseTestCompressedCSVRead):
+    compression = "bz2"
     csv_filename = "compressed.csv.bz2"
 
-    def write_file(self, path, contents):
-        with bz2.BZ2File(path, 'w') as f:
-            f.write(contents)
+    def compress(self, contents):
+        return bz2.compress(contents)
 
 
 def test_read_csv_does_not_close_passed_file_handles():